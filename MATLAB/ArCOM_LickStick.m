@@ -69,9 +69,11 @@ classdef ArCOM_LickStick < handle
         validDataTypes
         PortName
     end
+    properties (SetAccess = private)
+        Timeout = 3; % Read timeout (s). Use setTimeout() to change.
+    end
     properties (Access = private)
         InBuffer
-        Timeout = 3;
         TCPport = 11258;
         OutputBufferSize = 1000000; % Bytes
         InputBufferSize = 1000000; % Bytes
@@ -137,7 +139,7 @@ classdef ArCOM_LickStick < handle
             if nargin > 6
                 IOPortBackgroundReads = varargin{6};
                 if IOPortBackgroundReads
-                    IOPortBackgroundReadStr = ', PollLatency=0.001, StartBackgroundRead=1';
+                    IOPortBackgroundReadStr = ', PollLatency=0.001, StartBackgroundRead=4'; % Read granularity = 4 bytes (one uint32 sample)
                 end
             end
 
@@ -195,7 +197,7 @@ classdef ArCOM_LickStick < handle
                         fopen(obj.Port);
                         obj.JavaPortType = 0;
                     else
-                        obj.Port = serialport(portString, baudRate);
+                        obj.Port = serialport(portString, baudRate, 'Timeout', obj.Timeout);
                         setDTR(obj.Port, true);
                         obj.JavaPortType = 1;
                     end
@@ -416,33 +418,21 @@ classdef ArCOM_LickStick < handle
                         nTotalBytes = nTotalBytes + nValues(i)*8;
                 end
             end
-            CurrentTime = clock;
-            StartTime = CurrentTime(end);
-            CurrentTime = StartTime;
-            while nTotalBytes > obj.InBuffer.bytesAvailable && (CurrentTime-StartTime < obj.Timeout)
-                CurrentTime = clock;
-                CurrentTime = CurrentTime(end);
+            StartTime = tic;
+            while nTotalBytes > obj.InBuffer.bytesAvailable && (toc(StartTime) < obj.Timeout)
                 switch obj.Interface
-                    case 0
+                    case 0 % Blocking read of the remaining bytes (returns early on port timeout)
+                        nBytesNeeded = nTotalBytes - obj.InBuffer.bytesAvailable;
                         if obj.JavaPortType == 0
-                            nBytesAvailable = obj.Port.BytesAvailable;
+                            NewBytes = fread(obj.Port, nBytesNeeded, 'uint8')';
                         else
-                            nBytesAvailable = obj.Port.NumBytesAvailable;
-                        end
-                        if nBytesAvailable > 0
-                            if obj.JavaPortType == 0
-                                NewBytes = fread(obj.Port, nBytesAvailable, 'uint8')';
-                            else
-                                NewBytes = obj.Port.read(nBytesAvailable, 'uint8');
-                            end
-                            obj.InBuffer.write(NewBytes);
-                        end
-                    case 1
-                        nBytesAvailable = IOPort('BytesAvailable', obj.Port);
-                        if nBytesAvailable > 0
-                            NewBytes = IOPort('Read', obj.Port, 1, nBytesAvailable);
-                            obj.InBuffer.write(NewBytes);
+                            NewBytes = obj.Port.read(nBytesNeeded, 'uint8');
                         end
+                        obj.InBuffer.write(NewBytes);
+                    case 1 % Blocking read of the remaining bytes (returns early on ReceiveTimeout)
+                        nBytesNeeded = nTotalBytes - obj.InBuffer.bytesAvailable;
+                        NewBytes = IOPort('Read', obj.Port, 1, nBytesNeeded);
+                        obj.InBuffer.write(NewBytes);
                     case 2
                         error('Reading available bytes from a serial port buffer is not supported in Octave as of instrument control toolbox 0.2.2');
                     case 3
@@ -496,6 +486,20 @@ classdef ArCOM_LickStick < handle
             end
         end
 
+        function setTimeout(obj, newTimeout)
+            % Sets the read timeout (s) of ArCOM and the underlying port
+            switch obj.Interface
+                case {0, 3}
+                    obj.Port.Timeout = newTimeout;
+                case 1
+                    % IOPort can't be reconfigured during background reads. The port keeps its
+                    % ReceiveTimeout, and read() retries blocking reads until obj.Timeout elapses.
+                case 4
+                    pnet(obj.Port,'setreadtimeout',newTimeout);
+            end
+            obj.Timeout = newTimeout;
+        end
+
         function flush(obj)
             obj.read(obj.bytesAvailable, 'uint8');
         end
@@ -64,7 +64,8 @@ classdef LickStick < handle
         nDisplaySamples = 4000; % #samples to show when streaming to live plot
         maxDisplayTime = 2;     % When streaming to plot, show up to last 2 seconds
         extClkFreq = 40000000;  % Fixed frequency of crystal clock on the device (Hz) 
-        sampleDataTemplate;     % Template for preallocated sample data
+        drawInterval = 1/30;    % When streaming to plot, redraw at most every 1/30s (~30 FPS)
+        dataChunkSize = 1200000; % #samples to preallocate each time acquiredData fills (10 min at 2kHz)
     end
 
     methods
@@ -75,8 +76,9 @@ classdef LickStick < handle
             % Clear orphaned timers from previous instances
             obj.clearTimers(portName);
 
-            % Setup USB serial port
-            obj.Port = ArCOM_LickStick(portName, 480000000);
+            % Setup USB serial port. If the PsychToolbox IOPort interface is used,
+            % a background thread drains the port so GUI stalls do not back up USB data.
+            obj.Port = ArCOM_LickStick(portName, 480000000, [], [], [], [], 1);
             
             % Confirm firmware version
             obj.Port.write('F', 'uint8');
@@ -104,9 +106,6 @@ classdef LickStick < handle
             obj.info.measurementTime_us = 0; % Actual measurement time in µs, computed from rCount, settleCount, 
                                              % refDivider and extClkFreq. 
 
-            % Preallocate
-            obj.sampleDataTemplate = uint32(zeros(1,36000000)); % Preallocate 5 hours of samples
-
             % Finish setup
             obj.initialized = true;
             obj.computeMeasurementTime;
@@ -126,7 +125,7 @@ classdef LickStick < handle
                 newRate = 2000;
             end
             obj.samplingRate = newRate;
-            obj.nDisplaySamples = obj.samplingRate*obj.maxDisplayTime;
+            obj.nDisplaySamples = round(obj.samplingRate*obj.maxDisplayTime);
         end
 
         function set.ledEnabled(obj, newState)
@@ -213,8 +212,7 @@ classdef LickStick < handle
             if nargin > 1
                 nSamples = varargin{1};
             end
-            obj.Port.write('R', 'uint8', nSamples, 'uint32');
-            values = obj.Port.read(nSamples, 'uint32');
+            values = obj.readSamples(nSamples);
         end
 
         function autoSetThreshold(obj)
@@ -226,8 +224,7 @@ classdef LickStick < handle
             obj.assertNotStreaming('threshold');
             nSamplesToMeasure = 1000;
             rangeMultiple = 5;
-            obj.Port.write('R', 'uint8', nSamplesToMeasure, 'uint32'); % Request 10k samples
-            Values = obj.Port.read(nSamplesToMeasure, 'uint32');
+            Values = obj.readSamples(nSamplesToMeasure);
             vMax = max(Values); vMin = min(Values); vRange = vMax-vMin;
             newThreshold = vMin-(rangeMultiple*vRange);
             obj.threshold = newThreshold;
@@ -236,8 +233,8 @@ classdef LickStick < handle
         function clearAcquiredData(obj)
             % Clears acquired data in obj.acquiredData. Intended to be used in protocol
             % file just before main loop to exclude samples acquired during manual threshold setup
-            obj.acquiredData.Sensor = obj.sampleDataTemplate;
-            obj.acquiredData.TTL = uint8(obj.sampleDataTemplate);
+            obj.acquiredData.Sensor = zeros(1,obj.dataChunkSize,'uint32');
+            obj.acquiredData.TTL = zeros(1,obj.dataChunkSize,'uint8');
             obj.gui.acquiredDataPos = 1;
         end
 
@@ -247,8 +244,8 @@ classdef LickStick < handle
             % Setup data structure
             obj.acquiredData = struct;
             obj.acquiredData.nSamples = 0;
-            obj.acquiredData.Sensor = obj.sampleDataTemplate;
-            obj.acquiredData.TTL = uint8(obj.sampleDataTemplate);
+            obj.acquiredData.Sensor = zeros(1,obj.dataChunkSize,'uint32');
+            obj.acquiredData.TTL = zeros(1,obj.dataChunkSize,'uint8');
             obj.acquiredData.Params = struct; 
             obj.acquiredData.Params.threshold = obj.threshold;
             obj.acquiredData.Params.samplingRate = obj.samplingRate;
@@ -268,9 +265,10 @@ classdef LickStick < handle
 
             % Setup GUI handle structure
             obj.gui = struct;
-            obj.gui.DisplayIntensities = nan(1,obj.nDisplaySamples);
-            obj.gui.DisplayTTL = nan(1,obj.nDisplaySamples);
-            obj.gui.DisplayTimes = nan(1,obj.nDisplaySamples);
+            obj.gui.DisplayIntensities = nan(1,obj.nDisplaySamples,'single'); % Display only, full precision is logged to acquiredData
+            obj.gui.DisplayTTL = nan(1,obj.nDisplaySamples,'single');
+            obj.gui.SweepTimeAxis = (1:obj.nDisplaySamples)/obj.samplingRate; % Sample times relative to sweep start
+            obj.gui.SweepTimeAxisRate = obj.samplingRate; % Sampling rate used to build SweepTimeAxis
 
             % Setup GUI figure and UI elements
             obj.gui.Fig  = figure('name','Sensor Stream','numbertitle','off', 'MenuBar', 'none','Position',[100,400,1400,480], 'CloseRequestFcn', @(h,e)obj.endAcq());
@@ -288,10 +286,10 @@ classdef LickStick < handle
             obj.gui.resetRangeButton = uicontrol('Style', 'pushbutton', 'Position', [1290 10 100 20], 'FontSize', 12, 'String', 'RngReset', 'Callback',@(h,e)obj.UIresetRange);
             %set(gca, 'ylim', [15500000 16000000]);
             obj.gui.startStopButton = uicontrol('Style', 'pushbutton', 'Position', [1290 440 100 30], 'FontSize', 12, 'String', 'Stop', 'Callback',@(h,e)obj.uiStartStop);
-            Xdata = nan(1,obj.nDisplaySamples); Ydata = nan(1,obj.nDisplaySamples);
-            obj.gui.OscopeDataLine = line([Xdata,Xdata],[Ydata,Ydata], 'LineWidth', 1.5);
-            obj.gui.OscopeTTLLine = line([Xdata,Xdata],[Ydata,Ydata], 'Color','black', 'LineWidth', 1.5);
-            obj.gui.OscopeThreshLine = line([0, obj.nDisplaySamples],[obj.threshold,obj.threshold], 'Color','red','LineStyle','--');
+            obj.gui.OscopeDataLine = line(obj.gui.SweepTimeAxis, obj.gui.DisplayIntensities, 'LineWidth', 1.5, 'HitTest', 'off');
+            obj.gui.OscopeTTLLine = line(obj.gui.SweepTimeAxis, obj.gui.DisplayTTL, 'Color','black', 'LineWidth', 1.5, 'HitTest', 'off');
+            obj.gui.OscopeThreshLine = line([0, obj.nDisplaySamples],[obj.threshold,obj.threshold], 'Color','red','LineStyle','--', 'HitTest', 'off');
+            set(obj.gui.Plot, 'SortMethod', 'childorder'); % 2D plot, skip depth sorting on each redraw
             
             % Setup GUI variables
             obj.gui.DisplayPos = 1;
@@ -300,7 +298,9 @@ classdef LickStick < handle
             obj.gui.FirstSample = 1;
             obj.gui.resetRangeFlag = false;
             obj.gui.Ymax = NaN; obj.gui.Ymin = NaN;
+            obj.gui.YlimApplied = [];
             drawnow;
+            obj.gui.LastDrawTime = tic;
 
             % Setup & start GUI timer. The callback reads new data from the
             % serial port, logs the data and updates the plot.
@@ -314,59 +314,102 @@ classdef LickStick < handle
     end
     methods (Access = private) % Internal methods
         function updatePlot(obj)
-            BytesAvailable = obj.Port.bytesAvailable;
+            Port = obj.Port; % Cache handles and positions used repeatedly below
+            BytesAvailable = Port.bytesAvailable;
             if BytesAvailable > 1
                 nBytesToRead = floor(BytesAvailable/4)*4;
-                NewIntensities = obj.Port.read(nBytesToRead, 'uint8');
-                nIntensities = length(NewIntensities)/4;
-                lickDetectedBytes = NewIntensities(1:4:end);
-                LickDetected = bitget(lickDetectedBytes, 1);
+                nIntensities = nBytesToRead/4;
+                RawSamples = Port.read(nIntensities, 'uint32'); % Bit 0 of each sample = lick detected
+                LickDetected = uint8(bitand(RawSamples, uint32(1)));
                 NewDisplayTTL = (double(LickDetected)*double(obj.gui.Ymax-obj.gui.Ymin)) + double(obj.gui.Ymin);
-                NewIntensities(1:4:end) = bitset(lickDetectedBytes, 1, 0);
-                NewIntensities = typecast(NewIntensities, 'uint32');
-                obj.acquiredData.Sensor(obj.gui.acquiredDataPos:obj.gui.acquiredDataPos+nIntensities-1) = NewIntensities;
-                obj.acquiredData.TTL(obj.gui.acquiredDataPos:obj.gui.acquiredDataPos+nIntensities-1) = double(LickDetected);
-                obj.gui.acquiredDataPos = obj.gui.acquiredDataPos + nIntensities;
+                NewIntensities = bitand(RawSamples, uint32(4294967294));
+                AcquiredDataPos = obj.gui.acquiredDataPos;
+                if AcquiredDataPos+nIntensities-1 > length(obj.acquiredData.Sensor)
+                    obj.growAcquiredData;
+                end
+                AcquiredIndexes = AcquiredDataPos:AcquiredDataPos+nIntensities-1;
+                obj.acquiredData.Sensor(AcquiredIndexes) = NewIntensities;
+                obj.acquiredData.TTL(AcquiredIndexes) = LickDetected; % Already uint8, matching the TTL vector
+                obj.gui.acquiredDataPos = AcquiredDataPos + nIntensities;
                 Div = obj.samplingRate; % Polling frequency (Hz), determined by READ_INTERVAL (us) in firmware. 
-                Times = (obj.gui.DisplayPos:obj.gui.DisplayPos+nIntensities-1)/Div;
-                DisplayTime = (Times(end)-obj.gui.SweepStartTime);
-                obj.gui.DisplayPos = obj.gui.DisplayPos + nIntensities;
+                DisplayPos = obj.gui.DisplayPos + nIntensities;
+                DisplayTime = ((DisplayPos-1)/Div)-obj.gui.SweepStartTime;
+                obj.gui.DisplayPos = DisplayPos;
                 if DisplayTime >= obj.maxDisplayTime
+                    sweepMax = max(obj.gui.DisplayIntensities);
+                    sweepMin = min(obj.gui.DisplayIntensities);
                     if obj.gui.FirstSample || obj.gui.resetRangeFlag
-                        obj.gui.Ymax = max(obj.gui.DisplayIntensities);
-                        obj.gui.Ymin = min(obj.gui.DisplayIntensities);
+                        obj.gui.Ymax = sweepMax;
+                        obj.gui.Ymin = sweepMin;
                         obj.gui.FirstSample = 0;
                         obj.gui.resetRangeFlag = false;
+                        obj.gui.YlimApplied = [];
+                    end
+                    if sweepMax > obj.gui.Ymax
+                        obj.gui.Ymax = sweepMax;
                     end
-                    if max(obj.gui.DisplayIntensities) > obj.gui.Ymax
-                        obj.gui.Ymax = max(obj.gui.DisplayIntensities);
-                        set(obj.gui.Plot, 'ylim', [obj.gui.Ymin-(obj.gui.Ymin*0.0005) obj.gui.Ymax+(obj.gui.Ymax*0.0005)]);
+                    if sweepMin < obj.gui.Ymin
+                        obj.gui.Ymin = sweepMin;
                     end
-                    if min(obj.gui.DisplayIntensities) < obj.gui.Ymin
-                        obj.gui.Ymin = min(obj.gui.DisplayIntensities);
-                        set(obj.gui.Plot, 'ylim', [obj.gui.Ymin-(obj.gui.Ymin*0.0005) obj.gui.Ymax+(obj.gui.Ymax*0.0005)]);
+                    % Only change ylim when the signal range leaves the currently applied (padded) limits.
+                    % Limits are applied on the first sweep and after RngReset (YlimApplied = []), once the
+                    % range is non-degenerate (Ymax > Ymin, also false for NaN). Until then, ylim stays on auto.
+                    YlimApplied = obj.gui.YlimApplied;
+                    if obj.gui.Ymax > obj.gui.Ymin && (isempty(YlimApplied) ||...
+                            obj.gui.Ymin < YlimApplied(1) || obj.gui.Ymax > YlimApplied(2))
+                        obj.gui.YlimApplied = [obj.gui.Ymin-(obj.gui.Ymin*0.0005) obj.gui.Ymax+(obj.gui.Ymax*0.0005)];
+                        set(obj.gui.Plot, 'ylim', obj.gui.YlimApplied);
                     end
+                    obj.drawSweep; % Show the end of the sweep before it is cleared
                     obj.resetSweep;
                 else
-                    SweepTimes = Times-obj.gui.SweepStartTime;
-                    obj.gui.DisplayIntensities(obj.gui.DisplayPos-nIntensities:obj.gui.DisplayPos-1) = NewIntensities;
-                    obj.gui.DisplayTTL(obj.gui.DisplayPos-nIntensities:obj.gui.DisplayPos-1) = NewDisplayTTL;
-                    obj.gui.DisplayTimes(obj.gui.DisplayPos-nIntensities:obj.gui.DisplayPos-1) = SweepTimes;
+                    DisplayIndexes = DisplayPos-nIntensities:DisplayPos-1;
+                    obj.gui.DisplayIntensities(DisplayIndexes) = NewIntensities;
+                    obj.gui.DisplayTTL(DisplayIndexes) = NewDisplayTTL;
+                end
+                if toc(obj.gui.LastDrawTime) >= obj.drawInterval % Redraw at most once per drawInterval
+                    obj.drawSweep;
                 end
-                set(obj.gui.OscopeTTLLine,'xdata',[obj.gui.DisplayTimes, obj.gui.DisplayTimes], 'ydata', [obj.gui.DisplayTTL, obj.gui.DisplayTTL]);
-                set(obj.gui.OscopeDataLine,'xdata',[obj.gui.DisplayTimes, obj.gui.DisplayTimes], 'ydata', [obj.gui.DisplayIntensities, obj.gui.DisplayIntensities]); drawnow;
             end
             
         end
 
+        function drawSweep(obj)
+            % Push the display buffers to the plot lines and redraw
+            set(obj.gui.OscopeTTLLine, 'ydata', obj.gui.DisplayTTL); % xdata is fixed to SweepTimeAxis
+            set(obj.gui.OscopeDataLine, 'ydata', obj.gui.DisplayIntensities); drawnow;
+            obj.gui.LastDrawTime = tic;
+        end
+
+        function growAcquiredData(obj)
+            % Extend the preallocated data vectors by one chunk
+            obj.acquiredData.Sensor = [obj.acquiredData.Sensor zeros(1,obj.dataChunkSize,'uint32')];
+            obj.acquiredData.TTL = [obj.acquiredData.TTL zeros(1,obj.dataChunkSize,'uint8')];
+        end
+
         function resetSweep(obj)
-            obj.gui.DisplayIntensities(1:obj.nDisplaySamples) = NaN;
-            obj.gui.DisplayTTL(1:obj.nDisplaySamples) = NaN;
-            obj.gui.DisplayTimes(1:obj.nDisplaySamples) = NaN;
+            if obj.sweepTimeAxisChanged % Display duration or sampling rate was changed
+                obj.gui.DisplayIntensities = nan(1,obj.nDisplaySamples,'single');
+                obj.gui.DisplayTTL = nan(1,obj.nDisplaySamples,'single');
+                obj.gui.SweepTimeAxis = (1:obj.nDisplaySamples)/obj.samplingRate;
+                obj.gui.SweepTimeAxisRate = obj.samplingRate;
+                set(obj.gui.OscopeTTLLine, 'xdata', obj.gui.SweepTimeAxis, 'ydata', obj.gui.DisplayTTL);
+                set(obj.gui.OscopeDataLine, 'xdata', obj.gui.SweepTimeAxis, 'ydata', obj.gui.DisplayIntensities);
+            else
+                nWritten = min(obj.gui.DisplayPos-1, obj.nDisplaySamples); % Only clear samples written this sweep
+                obj.gui.DisplayIntensities(1:nWritten) = NaN;
+                obj.gui.DisplayTTL(1:nWritten) = NaN;
+            end
             obj.gui.DisplayPos = 1;
             obj.gui.SweepStartTime = 0;
         end
 
+        function changed = sweepTimeAxisChanged(obj)
+            % True if SweepTimeAxis no longer matches nDisplaySamples and samplingRate
+            changed = length(obj.gui.SweepTimeAxis) ~= obj.nDisplaySamples ||...
+                      obj.gui.SweepTimeAxisRate ~= obj.samplingRate;
+        end
+
         function uiSetThreshold(obj)
             newThreshold = str2double(get(obj.gui.thresholdSet, 'String'));
             obj.threshold = newThreshold;
@@ -377,7 +420,7 @@ classdef LickStick < handle
         function uiSetTmax(obj)
             newTmax = str2double(get(obj.gui.tMaxSet, 'String'));
             obj.maxDisplayTime = newTmax;
-            obj.nDisplaySamples = obj.samplingRate*obj.maxDisplayTime;
+            obj.nDisplaySamples = round(obj.samplingRate*obj.maxDisplayTime);
             set(obj.gui.Plot, 'xlim', [0 obj.maxDisplayTime]);
             obj.resetSweep;
         end
@@ -413,6 +456,9 @@ classdef LickStick < handle
         end
 
         function startAcq(obj)
+            if obj.sweepTimeAxisChanged % samplingRate was set while paused
+                obj.resetSweep;
+            end
             obj.streaming = true;
             obj.Port.write(['S' 1], 'uint8');
             start(obj.streamTimer);
@@ -422,6 +468,7 @@ classdef LickStick < handle
             obj.streaming = false;
             obj.Port.write(['S' 0], 'uint8');
             stop(obj.streamTimer);
+            obj.drawSweep; % Show samples received since the last throttled redraw
             pause(.1);
             obj.Port.flush;
         end
@@ -440,6 +487,16 @@ classdef LickStick < handle
             end
         end
 
+        function values = readSamples(obj, nSamples)
+            % Requests nSamples contiguous sensor readings and reads them.
+            % The read timeout is extended by the time the device needs to acquire them.
+            defaultTimeout = obj.Port.Timeout;
+            obj.Port.setTimeout(defaultTimeout + nSamples/obj.samplingRate);
+            restoreTimeout = onCleanup(@()obj.Port.setTimeout(defaultTimeout));
+            obj.Port.write('R', 'uint8', nSamples, 'uint32');
+            values = obj.Port.read(nSamples, 'uint32');
+        end
+
         function computeMeasurementTime(obj)
             if obj.initialized
                 SettleTime = (obj.settleCount*16)/(obj.extClkFreq/obj.refDivider);